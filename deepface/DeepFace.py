@@ -1,13 +1,11 @@
-import matplotlib.pyplot as plt
-from keras.preprocessing import image
 import warnings
 warnings.filterwarnings("ignore")
 import time
 import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import numpy as np
-import pandas as pd
-from tqdm import tqdm
-import json
 
 #from basemodels import VGGFace, OpenFace, Facenet, FbDeepFace
 #from extendedmodels import Age, Gender, Race, Emotion
@@ -15,7 +13,105 @@ import json
 
 from deepface.basemodels import VGGFace, OpenFace, Facenet, FbDeepFace
 from deepface.extendedmodels import Age, Gender, Race, Emotion
-from deepface.commons import functions, distance as dst
+from deepface.commons import functions, distance as dst, _detect_cache as detect_cache
+
+#distance metrics supported by verify()
+DISTANCE_METRICS = ('cosine', 'euclidean', 'euclidean_l2')
+
+#input shapes expected by each verification model backend
+INPUT_SHAPES = {
+	'VGG-Face': (224, 224)
+	, 'OpenFace': (96, 96)
+	, 'Facenet': (160, 160)
+	, 'DeepFace': (152, 152)
+}
+
+@lru_cache(maxsize=None)
+def _get_model(model_name):
+	#keeps loaded models alive between calls. re-reading the weights and
+	#rebuilding the keras graph dwarfs inference cost when verify/analyze
+	#are called in a loop.
+	loaders = {
+		'VGG-Face': VGGFace.loadModel
+		, 'OpenFace': OpenFace.loadModel
+		, 'Facenet': Facenet.loadModel
+		, 'DeepFace': FbDeepFace.loadModel
+		, 'Emotion': Emotion.loadModel
+		, 'Age': Age.loadModel
+		, 'Gender': Gender.loadModel
+		, 'Race': Race.loadModel
+	}
+
+	if model_name not in loaders:
+		raise ValueError("Invalid model_name passed - ", model_name)
+
+	return loaders[model_name]()
+
+def _stack_faces(faces):
+	#copies the (1,H,W,3) detection outputs into one contiguous float32
+	#batch tensor. a single preallocation instead of np.concatenate keeps
+	#peak memory down during batch assembly and feeds the model an input
+	#that needs no further casting or copying.
+	batch = np.empty((len(faces),) + faces[0].shape[1:], dtype=np.float32)
+	for i, face in enumerate(faces):
+		batch[i] = face[0]
+	return batch
+
+def _predict_batch(model, batch):
+	#feeds a preassembled batch through a tf.data pipeline so the framework
+	#can overlap host->device transfer with compute. for small inputs the
+	#pipeline set-up costs more than it saves, so fall back to a plain
+	#predict call. tensorflow is imported lazily to keep module import and
+	#pool-worker start-up cheap.
+	if batch.shape[0] <= 32:
+		return model.predict(batch, batch_size=batch.shape[0])
+
+	import tensorflow as tf
+
+	dataset = tf.data.Dataset.from_tensor_slices(batch) \
+		.batch(32) \
+		.prefetch(tf.data.experimental.AUTOTUNE)
+	return model.predict(dataset)
+
+_detection_pool = None
+
+def _get_detection_pool():
+	#one long-lived pool, reused across calls so worker start-up is paid at
+	#most once per process. the workers are started with spawn rather than
+	#the unix default fork: a model may already be loaded when detection
+	#runs, and forking a process with a live tensorflow runtime is a known
+	#deadlock hazard. spawned workers only import the lightweight commons
+	#module that hosts the task function, never keras.
+	global _detection_pool
+	if _detection_pool is None:
+		_detection_pool = ProcessPoolExecutor(max_workers=os.cpu_count()
+			, mp_context=multiprocessing.get_context('spawn'))
+	return _detection_pool
+
+def _detect_faces(tasks):
+	#runs face detection for a list of (img_path, target_size, grayscale)
+	#tasks. outputs are cached across calls (and across verify/analyze),
+	#so repeated sweeps over the same images only pay for detection once.
+	#uncached tasks run in parallel across processes when there is enough
+	#work to amortize the pool start-up cost.
+	faces = [detect_cache.get(*task) for task in tasks]
+
+	pending = [i for i, face in enumerate(faces) if face is None]
+	if len(pending) == 0:
+		return faces
+
+	pending_tasks = [tasks[i] for i in pending]
+	if len(pending_tasks) < 4:
+		detected = [functions.detectFaceTask(task) for task in pending_tasks]
+	else:
+		pool = _get_detection_pool()
+		detected = list(pool.map(functions.detectFaceTask, pending_tasks, chunksize=4))
+
+	for i, face in zip(pending, detected):
+		faces[i] = face
+		detect_cache.put(*tasks[i], face)
+
+	return faces
 
 def verify(img1_path, img2_path=''
 	, model_name ='VGG-Face', distance_metric = 'cosine', plot = False):
@@ -31,28 +127,19 @@ def verify(img1_path, img2_path=''
 		
 	#------------------------------
 	
-	if model_name == 'VGG-Face':
-		print("Using VGG-Face model backend and", distance_metric,"distance.")
-		model = VGGFace.loadModel()
-		input_shape = (224, 224)	
-	
-	elif model_name == 'OpenFace':
-		print("Using OpenFace model backend", distance_metric,"distance.")
-		model = OpenFace.loadModel()
-		input_shape = (96, 96)
-	
-	elif model_name == 'Facenet':
-		print("Using Facenet model backend", distance_metric,"distance.")
-		model = Facenet.loadModel()
-		input_shape = (160, 160)
-	
-	elif model_name == 'DeepFace':
-		print("Using FB DeepFace model backend", distance_metric,"distance.")
-		model = FbDeepFace.loadModel()
-		input_shape = (152, 152)
-	
-	else:
+	if model_name not in INPUT_SHAPES:
 		raise ValueError("Invalid model_name passed - ", model_name)
+
+	if distance_metric not in DISTANCE_METRICS:
+		raise ValueError("Invalid distance_metric passed - ", distance_metric)
+
+	#an empty bulk request has nothing to embed; short-circuit before batch
+	#assembly, which needs at least one face
+	if len(img_list) == 0:
+		return []
+
+	print("Using", model_name, "model backend and", distance_metric, "distance.")
+	input_shape = INPUT_SHAPES[model_name]
 	
 	#------------------------------
 	
@@ -60,232 +147,279 @@ def verify(img1_path, img2_path=''
 	threshold = functions.findThreshold(model_name, distance_metric)
 	
 	#------------------------------
-	resp_objects = []
-	for instance in img_list:
+	#pass 1: validate paths, crop and align all faces. inputs may also be
+	#already-decoded numpy arrays, which skip both the stat call and the
+	#detection stage entirely.
+
+	faces = [None] * (2 * len(img_list))
+	tasks = []
+	task_slots = []
+	missing = []
+	for pair_index, instance in enumerate(img_list):
 		if type(instance) == list and len(instance) >= 2:
-			img1_path = instance[0]
-			img2_path = instance[1]
-			
-			#----------------------
-			
-			if os.path.isfile(img1_path) != True:
-				raise ValueError("Confirm that ",img1_path," exists")
-			
-			if os.path.isfile(img2_path) != True:
-				raise ValueError("Confirm that ",img2_path," exists")
-			
-			#----------------------
-			#crop and align faces
-			
-			img1 = functions.detectFace(img1_path, input_shape)
-			img2 = functions.detectFace(img2_path, input_shape)
-			
-			#----------------------
-			#find embeddings
-	
-			img1_representation = model.predict(img1)[0,:]
-			img2_representation = model.predict(img2)[0,:]
-			
-			#----------------------
-			#find distances between embeddings
-			
-			if distance_metric == 'cosine':
-				distance = dst.findCosineDistance(img1_representation, img2_representation)
-			elif distance_metric == 'euclidean':
-				distance = dst.findEuclideanDistance(img1_representation, img2_representation)
-			elif distance_metric == 'euclidean_l2':
-				distance = dst.findEuclideanDistance(dst.l2_normalize(img1_representation), dst.l2_normalize(img2_representation))
-			else:
-				raise ValueError("Invalid distance_metric passed - ", distance_metric)
-			
-			#----------------------
-			#decision
-			
-			if distance <= threshold:
-				identified =  "true"
-			else:
-				identified =  "false"
-			#----------------------
-			if plot:
-				label = "Verified: "+identified
-				label += "\nThreshold: "+str(round(distance, 2))
-				label += ", Max Threshold to Verify: "+str(threshold)
-				label += "\nModel: "+model_name
-				label += ", Similarity metric: "+distance_metric
-				
-				fig = plt.figure()
-				fig.add_subplot(1,2, 1)
-				plt.imshow(img1[0][:, :, ::-1])
-				plt.xticks([]); plt.yticks([])
-				fig.add_subplot(1,2, 2)
-				plt.imshow(img2[0][:, :, ::-1])
-				plt.xticks([]); plt.yticks([])
-				fig.suptitle(label, fontsize=17)
-				plt.show(block=True)
-				
-			#----------------------
-			#response object
-			
-			resp_obj = "{"
-			resp_obj += "\"verified\": "+identified
-			resp_obj += ", \"distance\": "+str(distance)
-			resp_obj += ", \"max_threshold_to_verify\": "+str(threshold)
-			resp_obj += ", \"model\": \""+model_name+"\""
-			resp_obj += ", \"similarity_metric\": \""+distance_metric+"\""
-			resp_obj += "}"
-			
-			resp_obj = json.loads(resp_obj) #string to json
-			
-			if bulkProcess == True:
-				resp_objects.append(resp_obj)
-			else:
-				return resp_obj
-			#----------------------
-			
+			for j in range(0, 2):
+				img = instance[j]
+				slot = 2 * pair_index + j
+
+				if isinstance(img, np.ndarray):
+					#caller preloaded (and presumably aligned) this one
+					faces[slot] = img if img.ndim == 4 else np.expand_dims(img, axis=0)
+				elif not os.path.isfile(img):
+					missing.append(img)
+				else:
+					tasks.append((img, input_shape, False))
+					task_slots.append(slot)
+
 		else:
 			raise ValueError("Invalid arguments passed to verify function: ", instance)
-		
+
+	if missing:
+		raise ValueError("Confirm that these images exist: ", missing)
+
+	for slot, face in zip(task_slots, _detect_faces(tasks)):
+		faces[slot] = face
+
+	#------------------------------
+	#find embeddings for all faces in a single batched call instead of
+	#one predict call per image. the model is loaded only now, after
+	#detection ran, so the detection pool is never created underneath an
+	#initialized tensorflow runtime.
+
+	model = _get_model(model_name)
+	batch = _stack_faces(faces)
+	embeddings = _predict_batch(model, batch)
+
+	#the aligned faces are only needed again when plotting; drop them early
+	#so the memory is reclaimed during bulk runs
+	if not plot:
+		del faces, batch
+
+	#------------------------------
+	#find distances between embeddings for all pairs at once instead of
+	#per-pair python calls
+
+	if distance_metric in ('cosine', 'euclidean_l2'):
+		#L2-normalize the embeddings once; both metrics then derive from a
+		#single dot product per pair: cosine = 1 - sim and, on normalized
+		#vectors, ||a - b|| = sqrt(2 - 2 * sim)
+		embeddings = dst.l2_normalize_rows(embeddings)
+		similarities = np.einsum('ij,ij->i', embeddings[0::2], embeddings[1::2])
+
+		if distance_metric == 'cosine':
+			distances = 1 - similarities
+		else:
+			distances = np.sqrt(np.maximum(2 - 2 * similarities, 0))
+
+	else:
+		distances = dst.findEuclideanDistances(embeddings[0::2], embeddings[1::2])
+
+	#------------------------------
+	#pass 2: build responses
+
+	resp_objects = []
+	pending_plots = []
+	for i in range(0, len(img_list)):
+		distance = distances[i]
+
+		#----------------------
+		#decision
+
+		identified = bool(distance <= threshold)
+
+		#----------------------
+		if plot:
+			label = "Verified: "+str(identified)
+			label += "\nThreshold: "+str(round(distance, 2))
+			label += ", Max Threshold to Verify: "+str(threshold)
+			label += "\nModel: "+model_name
+			label += ", Similarity metric: "+distance_metric
+
+			pending_plots.append((faces[2*i], faces[2*i+1], label))
+
+		#----------------------
+		#response object
+
+		resp_obj = {
+			"verified": identified
+			, "distance": float(distance)
+			, "max_threshold_to_verify": float(threshold)
+			, "model": model_name
+			, "similarity_metric": distance_metric
+		}
+
+		resp_objects.append(resp_obj)
+		#----------------------
+
 	#-------------------------
-	
+	#render any requested plots in one pass after the hot loop, so figure
+	#construction and GUI I/O never block the per-pair work. matplotlib is
+	#also only imported when plots were actually requested.
+
+	if len(pending_plots) > 0:
+		import matplotlib.pyplot as plt
+
+		for img1, img2, label in pending_plots:
+			fig = plt.figure()
+			fig.add_subplot(1,2, 1)
+			plt.imshow(img1[0][:, :, ::-1])
+			plt.xticks([]); plt.yticks([])
+			fig.add_subplot(1,2, 2)
+			plt.imshow(img2[0][:, :, ::-1])
+			plt.xticks([]); plt.yticks([])
+			fig.suptitle(label, fontsize=17)
+
+		plt.show(block=True)
+
+	#-------------------------
+
 	toc = time.time()
-	
+
 	#print("identification lasts ",toc-tic," seconds")
-	
+
 	if bulkProcess == True:
 		return resp_objects
 
+	return resp_objects[0]
+
 def analyze(img_path, actions= []):
-	
+
+	#imported here so that importing DeepFace (e.g. in pool workers) does
+	#not pay for tqdm
+	from tqdm import tqdm
+
 	if type(img_path) == list:
 		img_paths = img_path.copy()
 		bulkProcess = True
 	else:
 		img_paths = [img_path]
 		bulkProcess = False
-	
+
 	#---------------------------------
-	
+
+	#an empty bulk request has nothing to analyze; short-circuit before any
+	#models are loaded or batches assembled
+	if len(img_paths) == 0:
+		return []
+
+	#---------------------------------
+
 	#if a specific target is not passed, then find them all
 	if len(actions) == 0:
 		actions= ['emotion', 'age', 'gender', 'race']
 	
 	print("Actions to do: ", actions)
-	
+
 	#---------------------------------
-	
+	#validate paths and preprocess all images up front, so each model can
+	#be fed one batch instead of one predict call per image
+
+	for img_path in img_paths:
+
+		if type(img_path) != str:
+			raise ValueError("You should pass string data type for image paths but you passed ", type(img_path))
+
+	missing = [p for p in img_paths if not os.path.isfile(p)]
+	if missing:
+		raise ValueError("Confirm that these images exist: ", missing)
+
+	#the 224x224 rgb crops are shared by the age, gender and race models;
+	#only the emotion model expects 48x48 grayscale input.
+	imgs224 = None
+	if {'age', 'gender', 'race'} & set(actions):
+		imgs224 = _stack_faces(_detect_faces([(p, (224, 224), False) for p in img_paths]))
+
+	imgs48 = None
 	if 'emotion' in actions:
-		emotion_model = Emotion.loadModel()
-	
+		imgs48 = _stack_faces(_detect_faces([(p, (48, 48), True) for p in img_paths]))
+
+	#---------------------------------
+	#models are loaded only after detection, so the detection pool is never
+	#created underneath an initialized tensorflow runtime
+
+	if 'emotion' in actions:
+		emotion_model = _get_model('Emotion')
+
 	if 'age' in actions:
-		age_model = Age.loadModel()
-	
+		age_model = _get_model('Age')
+
 	if 'gender' in actions:
-		gender_model = Gender.loadModel()
-	
+		gender_model = _get_model('Gender')
+
 	if 'race' in actions:
-		race_model = Race.loadModel()
+		race_model = _get_model('Race')
+
 	#---------------------------------
-	
+	#one batched predict call per model
+
+	predictions = {}
+
+	pbar = tqdm(range(0,len(actions)), desc='Finding actions')
+
+	for index in pbar:
+		action = actions[index]
+		pbar.set_description("Action: %s" % (action))
+
+		if action == 'emotion':
+			predictions['emotion'] = _predict_batch(emotion_model, imgs48)
+		elif action == 'age':
+			predictions['age'] = _predict_batch(age_model, imgs224)
+		elif action == 'gender':
+			predictions['gender'] = _predict_batch(gender_model, imgs224)
+		elif action == 'race':
+			predictions['race'] = _predict_batch(race_model, imgs224)
+
+	#---------------------------------
+	#assemble per-image responses from the sliced prediction rows
+
 	resp_objects = []
-	for img_path in img_paths:
-		
-		if type(img_path) != str:
-			raise ValueError("You should pass string data type for image paths but you passed ", type(img_path))
-		
-		if os.path.isfile(img_path) != True:
-			raise ValueError("Confirm that ",img_path," exists")
-		
-		resp_obj = "{"
-		
-		#TO-DO: do this in parallel
-		
-		pbar = tqdm(range(0,len(actions)), desc='Finding actions')
-		
-		action_idx = 0
-		#for action in actions:
-		for index in pbar:
-			action = actions[index]
-			pbar.set_description("Action: %s" % (action))
-			
-			if action_idx > 0:
-				resp_obj += ", "
-			
+	for i in range(0, len(img_paths)):
+
+		resp_obj = {}
+
+		for action in actions:
+
 			if action == 'emotion':
 				emotion_labels = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
-				img = functions.detectFace(img_path, (48, 48), True)
-				
-				emotion_predictions = emotion_model.predict(img)[0,:]
-				
-				sum_of_predictions = emotion_predictions.sum()
-				
-				emotion_obj = "\"emotion\": {"
-				for i in range(0, len(emotion_labels)):
-					emotion_label = emotion_labels[i]
-					emotion_prediction = 100 * emotion_predictions[i] / sum_of_predictions
-					
-					if i > 0: emotion_obj += ", "
-					
-					emotion_obj += "\"%s\": %s" % (emotion_label, emotion_prediction)
-				
-				emotion_obj += "}"
-				
-				emotion_obj += ", \"dominant_emotion\": \"%s\"" % (emotion_labels[np.argmax(emotion_predictions)])
-				
-				resp_obj += emotion_obj
-				
+				emotion_predictions = predictions['emotion'][i]
+
+				#multiply by the inverse once instead of dividing per label
+				inv_sum = 100.0 / emotion_predictions.sum()
+
+				resp_obj["emotion"] = {
+					emotion_label: float(emotion_predictions[j] * inv_sum)
+					for j, emotion_label in enumerate(emotion_labels)
+				}
+				resp_obj["dominant_emotion"] = emotion_labels[int(np.argmax(emotion_predictions))]
+
 			elif action == 'age':
-				img = functions.detectFace(img_path, (224, 224), False) #just emotion model expects grayscale images
 				#print("age prediction")
-				age_predictions = age_model.predict(img)[0,:]
-				apparent_age = Age.findApparentAge(age_predictions)
-				
-				resp_obj += "\"age\": %s" % (apparent_age)
-				
+				apparent_age = Age.findApparentAge(predictions['age'][i])
+
+				resp_obj["age"] = float(apparent_age)
+
 			elif action == 'gender':
-				img = functions.detectFace(img_path, (224, 224), False) #just emotion model expects grayscale images
 				#print("gender prediction")
-				
-				gender_prediction = gender_model.predict(img)[0,:]
-				
-				if np.argmax(gender_prediction) == 0:
-					gender = "Woman"
-				elif np.argmax(gender_prediction) == 1:
-					gender = "Man"
-				
-				resp_obj += "\"gender\": \"%s\"" % (gender)
-				
+				gender_prediction = predictions['gender'][i]
+
+				resp_obj["gender"] = ("Woman", "Man")[int(np.argmax(gender_prediction))]
+
 			elif action == 'race':
-				img = functions.detectFace(img_path, (224, 224), False) #just emotion model expects grayscale images
-				race_predictions = race_model.predict(img)[0,:]
+				race_predictions = predictions['race'][i]
 				race_labels = ['asian', 'indian', 'black', 'white', 'middle eastern', 'latino hispanic']
-				
-				sum_of_predictions = race_predictions.sum()
-				
-				race_obj = "\"race\": {"
-				for i in range(0, len(race_labels)):
-					race_label = race_labels[i]
-					race_prediction = 100 * race_predictions[i] / sum_of_predictions
-					
-					if i > 0: race_obj += ", "
-					
-					race_obj += "\"%s\": %s" % (race_label, race_prediction)
-				
-				race_obj += "}"
-				race_obj += ", \"dominant_race\": \"%s\"" % (race_labels[np.argmax(race_predictions)])
-				
-				resp_obj += race_obj
-			
-			action_idx = action_idx + 1
-		
-		resp_obj += "}"
-		
-		resp_obj = json.loads(resp_obj)
-		
+
+				inv_sum = 100.0 / race_predictions.sum()
+
+				resp_obj["race"] = {
+					race_label: float(race_predictions[j] * inv_sum)
+					for j, race_label in enumerate(race_labels)
+				}
+				resp_obj["dominant_race"] = race_labels[int(np.argmax(race_predictions))]
+
 		if bulkProcess == True:
 			resp_objects.append(resp_obj)
 		else:
 			return resp_obj
-	
+
 	if bulkProcess == True:
 		return resp_objects
 
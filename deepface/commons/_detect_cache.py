@@ -0,0 +1,32 @@
+import os
+from collections import OrderedDict
+
+#detection outputs are keyed on (path, target_size, grayscale, mtime) so a
+#re-exported image file invalidates its own entries. this is a manual LRU
+#rather than functools.lru_cache so that results computed in worker
+#processes can be inserted from the outside.
+MAX_ENTRIES = 4096
+
+_cache = OrderedDict()
+
+
+def _make_key(img_path, target_size, grayscale):
+    return img_path, target_size, grayscale, os.path.getmtime(img_path)
+
+
+def get(img_path, target_size=None, grayscale=False):
+    #returns the cached detection output for these arguments, or None when
+    #it has not been computed yet (or the file changed since)
+    key = _make_key(img_path, target_size, grayscale)
+    face = _cache.get(key)
+    if face is not None:
+        _cache.move_to_end(key)
+    return face
+
+
+def put(img_path, target_size, grayscale, face):
+    key = _make_key(img_path, target_size, grayscale)
+    _cache[key] = face
+    _cache.move_to_end(key)
+    while len(_cache) > MAX_ENTRIES:
+        _cache.popitem(last=False)
@@ -13,7 +13,23 @@ def findEuclideanDistance(source_representation, test_representation):
     return euclidean_distance
 
 def l2_normalize(x):
-    return x / np.sqrt(np.sum(np.multiply(x, x)))	
+    return x / np.sqrt(np.sum(np.multiply(x, x)))
+
+#bulk variants that operate on whole (N, D) representation matrices at once,
+#so verification over many pairs costs one BLAS call instead of N python
+#level calls
+
+def findCosineDistances(source_representations, test_representations):
+    a = np.einsum('ij,ij->i', source_representations, test_representations)
+    b = np.linalg.norm(source_representations, axis=1)
+    c = np.linalg.norm(test_representations, axis=1)
+    return 1 - (a / (b * c))
+
+def findEuclideanDistances(source_representations, test_representations):
+    return np.linalg.norm(source_representations - test_representations, axis=1)
+
+def l2_normalize_rows(x):
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
 
 """def l2_normalize(x, axis=-1, epsilon=1e-10):
     output = x / np.sqrt(np.maximum(np.sum(np.square(x), axis=axis, keepdims=True), epsilon))
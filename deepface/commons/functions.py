@@ -7,8 +7,6 @@ from typing import Tuple
 import cv2
 import numpy as np
 import pandas as pd
-from PIL import Image
-from keras.preprocessing import image
 
 
 def distance(a, b):
@@ -112,6 +110,17 @@ def findThreshold(model_name, distance_metric):
     return threshold
 
 
+def detectFaceTask(task: Tuple[str, Tuple[int, int], bool]) -> np.ndarray:
+    """
+    single-argument adapter around `detectFace` so detection tasks can be
+    mapped over a process pool. it lives in this module so that pool workers
+    only have to import the lightweight commons, not the keras-backed model
+    modules.
+    """
+    image_path, target_size, grayscale = task
+    return detectFace(image_path, target_size, grayscale)[0]
+
+
 def detectFace(image_path, target_size=None, grayscale=False) -> Tuple[np.ndarray, float, bool, Tuple[int]]:
     """
     detects the face in an image, rotates (roll) if necessary (based on location of two eyes), and resizes the face.
@@ -130,7 +139,7 @@ def detectFace(image_path, target_size=None, grayscale=False) -> Tuple[np.ndarra
     face_detector_path = path + "/data/haarcascade_frontalface_default.xml"
     eye_detector_path = path + "/data/haarcascade_eye.xml"
 
-    if os.path.isfile(face_detector_path) != True:
+    if not os.path.isfile(face_detector_path):
         raise ValueError("Confirm that opencv is installed on your environment! Expected path ", face_detector_path,
                          " violated.")
 
@@ -227,8 +236,12 @@ def detectFace(image_path, target_size=None, grayscale=False) -> Tuple[np.ndarra
             if direction == -1:
                 angle = 90 - angle
 
-            img = Image.fromarray(img_raw)
-            img = np.array(img.rotate(direction * angle))
+            # rotate with cv2 instead of a PIL round-trip; warpAffine is
+            # SIMD-vectorized and avoids two ndarray<->Image conversions
+            center = (img_raw.shape[1] / 2, img_raw.shape[0] / 2)
+            rotation_matrix = cv2.getRotationMatrix2D(center, direction * angle, 1)
+            img = cv2.warpAffine(img_raw, rotation_matrix,
+                                 (img_raw.shape[1], img_raw.shape[0]))
 
             # you recover the base image and face detection disappeared. apply again.
             faces = face_detector.detectMultiScale(img, 1.3, 5)
@@ -253,7 +266,12 @@ def detectFace(image_path, target_size=None, grayscale=False) -> Tuple[np.ndarra
     if target_size:
         detected_face = cv2.resize(detected_face, target_size)
 
-    img_pixels = image.img_to_array(detected_face)
+    # stay in uint8 through detection/resize and cast to float32 exactly once
+    # here; the models take float32 input, so no implicit downcast copy
+    # happens inside keras later on.
+    img_pixels = np.asarray(detected_face, dtype=np.float32)
+    if img_pixels.ndim == 2:  # grayscale images lack the channel axis
+        img_pixels = img_pixels[:, :, np.newaxis]
     img_pixels = np.expand_dims(img_pixels, axis=0)
 
     # normalize input in [0, 1]
@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 import csv
+import hashlib
 import json
 import os
 import random
+from concurrent.futures import ThreadPoolExecutor
 from abc import abstractmethod
-from collections import defaultdict
 from dataclasses import dataclass
 from enum import Enum
 from itertools import islice
@@ -13,13 +14,32 @@ from typing import Dict, Any, Tuple, List, Optional, Union, Iterator, Callable
 
 import cv2
 import numpy as np
-from sklearn.model_selection import GroupShuffleSplit
 
 from lr_face.utils import cache
 
 Augmenter = Callable[[np.ndarray], np.ndarray]
 
 
+@cache
+def _read_image(path: str) -> np.ndarray:
+    """
+    Reads and decodes the image stored at `path`. The decoded array is cached
+    and marked read-only, so that `get_image` calls with different
+    resolution/normalize/augmenter combinations share a single decode of the
+    same file.
+
+    :param path: str
+    :return: np.ndarray
+    """
+    res = cv2.imread(path)
+    if res is None:
+        raise ValueError(f'Reading {path} resulted in None')
+    if res.shape[-1] != 3:
+        raise ValueError(f'Expected 3 channels, got {res.shape[-1]}')
+    res.setflags(write=False)
+    return res
+
+
 class Yaw(Enum):
     FRONTAL = "straight"
     HALF_TURNED = "slightly_turned"
@@ -84,19 +104,41 @@ class FaceImage:
         :param augmenter: Optional[Augmenter]
         :return: np.ndarray
         """
-        res = cv2.imread(self.path)
+        res = getattr(self, '_decoded', None)
         if res is None:
-            raise ValueError(f'Reading {self.path} resulted in None')
-        if res.shape[-1] != 3:
-            raise ValueError(f'Expected 3 channels, got {res.shape[-1]}')
+            res = _read_image(self.path)
         if augmenter:
-            res = augmenter(res)
+            # Copy, since the cached decode is shared and augmenters may
+            # modify their input in place.
+            res = augmenter(res.copy())
         if resolution:
             res = cv2.resize(res, (resolution[1], resolution[0]))
         if normalize:
             res = res / 255
         return res
 
+    @classmethod
+    def from_bytes(cls, buffer: bytes, identity: str) -> FaceImage:
+        """
+        Creates a `FaceImage` from an in-memory encoded image (e.g. the raw
+        contents of a JPEG file), avoiding a round-trip over the filesystem.
+        The synthetic `bytes://` path is derived from the buffer contents so
+        that hashing, equality and the `get_image` cache behave the same way
+        they do for file-backed images.
+
+        :param buffer: bytes
+        :param identity: str
+        :return: FaceImage
+        """
+        decoded = cv2.imdecode(np.frombuffer(buffer, np.uint8),
+                               cv2.IMREAD_COLOR)
+        if decoded is None:
+            raise ValueError('Decoding the image buffer resulted in None')
+        decoded.setflags(write=False)
+        instance = cls(f'bytes://{hashlib.md5(buffer).hexdigest()}', identity)
+        instance._decoded = decoded
+        return instance
+
     def __post_init__(self):
         if not self.meta:
             self.meta = dict()
@@ -170,12 +212,48 @@ class FaceTriplet:
             raise ValueError(
                 'Anchor and negative image have the same identity')
 
+    @classmethod
+    def _from_trusted(cls,
+                      anchor: FaceImage,
+                      positive: FaceImage,
+                      negative: FaceImage) -> FaceTriplet:
+        """
+        Constructs a `FaceTriplet` without running the `__post_init__`
+        identity validation. Only for internal callers like `make_triplets`
+        that guarantee the identity invariants by construction; everyone
+        else should use the regular, validating constructor.
+        """
+        triplet = cls.__new__(cls)
+        triplet.anchor = anchor
+        triplet.positive = positive
+        triplet.negative = negative
+        return triplet
+
 
 class DummyFaceImage(FaceImage):
     """
     A dummy class that can be used in place of a real `FaceImage` for testing.
     """
 
+    @staticmethod
+    @cache
+    def _synth(identity: str, height: int, width: int) -> np.ndarray:
+        """
+        Synthesizes the random pixel data for an identity at the given
+        resolution, seeded on the identity so repeated calls return the same
+        image. The result is cached and marked read-only because it is
+        shared between all dummy instances with this identity.
+
+        :param identity: str
+        :param height: int
+        :param width: int
+        :return: np.ndarray
+        """
+        rng = np.random.default_rng(hash(identity) & 0xffffffff)
+        image = rng.random(size=(height, width, 3))
+        image.setflags(write=False)
+        return image
+
     @cache
     def get_image(
             self,
@@ -189,9 +267,11 @@ class DummyFaceImage(FaceImage):
         """
         if not resolution:
             resolution = (100, 100)
-        image = np.random.random(size=(*resolution, 3))
+        image = self._synth(self.identity, *resolution)
         if augmenter:
-            image = augmenter(image)
+            # The synthesized array is shared, so the augmenter gets its own
+            # copy to work on.
+            image = augmenter(image.copy())
         image = cv2.resize(image, (resolution[1], resolution[0]))
         if normalize:
             image = image / 255
@@ -681,58 +761,75 @@ def make_pairs(data: Union[Dataset, List[FaceImage]],
     Returns:
         A list of `FacePair` instances.
     """
-    images_by_identity = defaultdict(list)
-    for x in data:
-        images_by_identity[x.identity].append(x)
+    images = data.images if isinstance(data, Dataset) else list(data)
+
+    # Factor the identity strings into small integer codes (in order of first
+    # appearance), so that all pair enumeration below runs on int arrays at
+    # C level instead of comparing strings in nested Python loops.
+    code_of: Dict[str, int] = {}
+    codes = np.array([code_of.setdefault(x.identity, len(code_of))
+                      for x in images], dtype=int)
+    num_identities = len(code_of)
+
+    # Group the images by identity code so random image picks are O(1).
+    groups: List[List[FaceImage]] = [[] for _ in range(num_identities)]
+    for x, code in zip(images, codes):
+        groups[code].append(x)
+
+    # A stable sort on the codes gives us the images grouped by identity in
+    # order of first appearance, with the original order preserved within
+    # each group - the same enumeration order the old nested loops produced.
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
 
     res = []
-    identities = set(images_by_identity.keys())
 
     # First we handle the case when `same` is False, meaning we don't have to
     # make any positive pairs, just negative pairs.
     if same is False:
         if n is None:
-            # Again, omitting `n` when `same` is False can lead to an explosion
-            # in the number of negative pairs that have to be made. Just look
-            # at how many nested for loops we need below. This combination of
-            # arguments should only be used when you know that the number of
+            # Omitting `n` when `same` is False can lead to an explosion in
+            # the number of negative pairs: this enumerates every ordered
+            # cross-identity combination. The full mask is computed in one
+            # vectorized pass; only use this when you know the number of
             # negative pairs will remain manageable.
-            for identity, images in images_by_identity.items():
-                for image in images:
-                    for negative_id in identities - {identity}:
-                        for negative in images_by_identity[negative_id]:
-                            res.append(FacePair(image, negative))
+            first_idx, second_idx = np.nonzero(
+                sorted_codes[:, None] != sorted_codes[None, :])
+            res = [FacePair(images[order[i]], images[order[j]])
+                   for i, j in zip(first_idx, second_idx)]
         else:
-            # If `n` is not omitted we simply create `n` random negative pairs.
-            for _ in range(n):
-                a, b = random.sample(identities, 2)
-                res.append(
-                    FacePair(
-                        random.choice(images_by_identity[a]),
-                        random.choice(images_by_identity[b])
-                    )
-                )
+            # If `n` is not omitted we simply create `n` random negative
+            # pairs (duplicates allowed, as before). Drawing a random code
+            # plus a random non-zero shift modulo the number of identities
+            # guarantees two different identities per pair.
+            a = np.random.randint(0, num_identities, size=n)
+            shift = 1 + np.random.randint(0, num_identities - 1, size=n)
+            b = (a + shift) % num_identities
+            res = [FacePair(random.choice(groups[i]), random.choice(groups[j]))
+                   for i, j in zip(a, b)]
 
     else:
         # If `same` is either True or omitted (None) we are going to need the
-        # positive pairs.
-        for identity, images in images_by_identity.items():
-            for i, image in enumerate(images):
-                for positive in images[i + 1:]:
-                    res.append(FacePair(image, positive))
+        # positive pairs: all unordered same-identity combinations, gathered
+        # through one triangular index mask.
+        i_idx, j_idx = np.triu_indices(len(images), k=1)
+        positive = sorted_codes[i_idx] == sorted_codes[j_idx]
+        res = [FacePair(images[order[i]], images[order[j]])
+               for i, j in zip(i_idx[positive], j_idx[positive])]
 
         # If `same` is omitted (None), it means we need to generate an equal
-        # number of negative pairs.
+        # number of negative pairs, each containing one of the images from a
+        # positive pair and a randomly chosen image of another identity.
         if same is None:
-            # Loop over and unpack all positive pairs, then create matching
-            # negative pairs that contain at least one of the images from each
-            # positive pair and a randomly chosen other image with a different
-            # identity.
-            for first, second in res.copy():  # Copy, because we modify `res`.
-                identity = first.identity
-                negative_id = random.choice(tuple(identities - {identity}))
-                negative = random.choice(images_by_identity[negative_id])
-                res.append(FacePair(random.choice([first, second]), negative))
+            pos_codes = sorted_codes[i_idx[positive]]
+            shift = 1 + np.random.randint(0, num_identities - 1,
+                                          size=len(res))
+            neg_codes = (pos_codes + shift) % num_identities
+            res += [
+                FacePair(random.choice([pair.first, pair.second]),
+                         random.choice(groups[c]))
+                for pair, c in zip(res, neg_codes)
+            ]
 
         if n:
             res = random.sample(res, min(len(res), n))
@@ -740,24 +837,51 @@ def make_pairs(data: Union[Dataset, List[FaceImage]],
 
 
 def make_triplets(data: Union[Dataset, List[FaceImage]]) -> List[FaceTriplet]:
-    images_by_identity = defaultdict(list)
-    for x in data:
-        images_by_identity[x.identity].append(x)
-
-    identities = set(images_by_identity.keys())
-    if len(identities) < 2:
+    images = data.images if isinstance(data, Dataset) else list(data)
+
+    # The same identity factoring as in `make_pairs`: insertion-ordered
+    # integer codes, so the grouping and negative sampling below run on int
+    # arrays instead of nested Python loops over identity sets.
+    code_of: Dict[str, int] = {}
+    codes = np.array([code_of.setdefault(x.identity, len(code_of))
+                      for x in images], dtype=int)
+    num_identities = len(code_of)
+    if num_identities < 2:
         raise ValueError(
             "Can't make triplets if there are fewer than 2 unique identities.")
 
-    triplets = []
-    for identity, images in images_by_identity.items():
-        for i, anchor in enumerate(images):
-            for positive in images[i + 1:]:
-                # TODO: requires better negative sampling, currently random.
-                negative_id = random.choice(tuple(identities - {identity}))
-                negative = random.choice(images_by_identity[negative_id])
-                triplets.append(FaceTriplet(anchor, positive, negative))
-    return triplets
+    # A stable sort groups the image indices by identity while keeping the
+    # original order within each group, matching the enumeration order of
+    # the old nested loops.
+    order = np.argsort(codes, kind='stable')
+    group_sizes = np.bincount(codes)
+
+    # Anchor/positive pairs are all intra-group combinations, one triangular
+    # index mask per group.
+    anchor_idx = []
+    positive_idx = []
+    start = 0
+    for size in group_sizes:
+        i, j = np.triu_indices(size, k=1)
+        anchor_idx.append(order[start + i])
+        positive_idx.append(order[start + j])
+        start += size
+    anchor_idx = np.concatenate(anchor_idx)
+    positive_idx = np.concatenate(positive_idx)
+
+    # TODO: requires better negative sampling, currently random. A random
+    # non-zero code shift guarantees a different identity per triplet; the
+    # negative image is then a random member of that identity's group.
+    shift = 1 + np.random.randint(0, num_identities - 1, size=len(anchor_idx))
+    neg_codes = (codes[anchor_idx] + shift) % num_identities
+    group_starts = np.concatenate(([0], np.cumsum(group_sizes)[:-1]))
+    offsets = np.random.randint(0, group_sizes[neg_codes])
+    negative_idx = order[group_starts[neg_codes] + offsets]
+
+    # The index construction above guarantees the identity invariants, so
+    # the validating constructor would only repeat work here.
+    return [FaceTriplet._from_trusted(images[a], images[p], images[n])
+            for a, p, n in zip(anchor_idx, positive_idx, negative_idx)]
 
 
 def to_array(
@@ -824,25 +948,45 @@ def to_array(
         raise ValueError(
             'Return type for `to_array()` with empty data is ambiguous')
 
-    # When `data` is a `Dataset` or a list of `FaceImage` instances.
-    if isinstance(data, Dataset) or all(
-            isinstance(x, FaceImage) for x in data):
-        image_data = [x.get_image(
-            resolution,
-            normalize,
-            augmenter
-        ) for x in data]
-        if len(set([x.shape for x in image_data])) > 1:
-            raise ValueError(
-                'Not all images have the same dimensions, '
-                'cannot convert them to a single array.')
-        return np.array(image_data)
+    # When `data` is a `Dataset` or a list of `FaceImage` instances. The
+    # lists this function accepts are homogeneous, so inspecting the first
+    # element is enough to dispatch on; scanning all elements only to pick a
+    # branch would be O(N) wasted work on every call.
+    if isinstance(data, Dataset) or isinstance(data[0], FaceImage):
+        images = data.images if isinstance(data, Dataset) else data
+
+        # Preallocate the full output array once and write each image into
+        # its own slice. This avoids keeping `N` temporary arrays alive plus
+        # paying for a final stacking copy, and fails fast on the first image
+        # whose dimensions don't match instead of loading everything first.
+        first = images[0].get_image(resolution, normalize, augmenter)
+        res = np.empty((len(images), *first.shape), dtype=first.dtype)
+        res[0] = first
+
+        def fill(i: int):
+            image = images[i].get_image(resolution, normalize, augmenter)
+            if image.shape != first.shape:
+                raise ValueError(
+                    'Not all images have the same dimensions, '
+                    'cannot convert them to a single array.')
+            res[i] = image
+
+        # Since cv2 releases the GIL during decoding and resizing, threads
+        # give real parallelism here. For small inputs the scheduling
+        # overhead isn't worth it, so those stay on the sequential path.
+        if len(images) >= 8:
+            with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                # Consume the iterator so worker exceptions propagate.
+                list(executor.map(fill, range(1, len(images))))
+        else:
+            for i in range(1, len(images)):
+                fill(i)
+        return res
 
     # When `data` is a list of `FacePair` instances or `FaceTriplet` instances
     # we recursively apply this method on each separate list of images we can
     # make from the pairs or triplets.
-    if all(isinstance(x, FacePair) for x in data) or all(
-            isinstance(x, FaceTriplet) for x in data):
+    if isinstance(data[0], (FacePair, FaceTriplet)):
         return [to_array(
             x,
             resolution,
@@ -870,9 +1014,16 @@ def split_by_identity(
     :param test_size: float
     :return: Tuple[List[FaceImage], List[FaceImage]]
     """
-    identities = [x.identity for x in data]
-    gss = GroupShuffleSplit(n_splits=1, test_size=test_size)
     if isinstance(data, Dataset):
         data = data.images
-    train_idx, test_idx = next(gss.split(data, groups=identities))
-    return [data[idx] for idx in train_idx], [data[idx] for idx in test_idx]
+    identities = np.array([x.identity for x in data])
+    unique_identities, inv = np.unique(identities, return_inverse=True)
+
+    # Shuffle the unique identities once and reserve a `test_size` fraction
+    # of them (rounded up, like `GroupShuffleSplit` used to) for the test
+    # split; a single `np.isin` pass then assigns every image to its side.
+    n_test = int(np.ceil(test_size * len(unique_identities)))
+    perm = np.random.permutation(len(unique_identities))
+    mask = np.isin(inv, perm[:n_test])
+    return ([data[idx] for idx in np.flatnonzero(~mask)],
+            [data[idx] for idx in np.flatnonzero(mask)])
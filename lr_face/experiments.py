@@ -119,7 +119,9 @@ class ExperimentalSetup:
         """
         if not calibrator_names:
             calibrator_names = CALIBRATORS['current_set_up']
-        return [CALIBRATORS['all'][c] for c in calibrator_names]
+        # The configured values are zero-argument callables so that only the
+        # selected calibrators are ever instantiated.
+        return [CALIBRATORS['all'][c]() for c in calibrator_names]
 
     @staticmethod
     def _get_scorers(scorer_names: Optional[List[str]] = None) \
@@ -173,7 +175,16 @@ class ExperimentalSetup:
         """
         if not data_config_names:
             data_config_names = DATA['current_set_up']
-        return [DATA['all'][key] for key in data_config_names]
+
+        # The `datasets` entries are zero-argument callables (lazy loading),
+        # so instantiation - and the file system scanning that comes with it -
+        # only happens here, for the selected configurations.
+        configs = []
+        for key in data_config_names:
+            config = dict(DATA['all'][key])
+            config['datasets'] = config['datasets']()
+            configs.append(config)
+        return configs
 
     @property
     def params_keys(self) -> List[str]:
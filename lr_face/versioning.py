@@ -2,7 +2,31 @@ from __future__ import annotations
 
 import os
 import re
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
+
+# Compiled once at module level; the `re` module's internal cache is limited
+# and each call would still dispatch through the pattern lookup.
+_TAG_RE = re.compile(r'-([^-]+)(?:-(\d+))?$')
+
+
+@lru_cache(maxsize=1024)
+def _parse_filename(filename: str) -> Tuple[str, Optional[int]]:
+    """
+    Parses a tagged filename into a `(name, version)` tuple. Cached, because
+    the code that scans weights directories calls this repeatedly on the same
+    filenames.
+
+    :param filename: str
+    :return: Tuple[str, Optional[int]]
+    """
+    basename, _ = os.path.splitext(filename)
+    matches = _TAG_RE.search(basename)
+    if matches:
+        name = matches.group(1)
+        version = matches.group(2)
+        return name, int(version) if version else None
+    raise ValueError(f'Could not deduce tag from file {filename}')
 
 
 class Tag:
@@ -19,13 +43,10 @@ class Tag:
 
     @classmethod
     def from_filename(cls, filename: str) -> Tag:
-        basename, _ = os.path.splitext(filename)
-        matches = re.search(r'-([^-]+)(?:-(\d+))?$', basename)
-        if matches:
-            name = matches.group(1)
-            version = matches.group(2)
-            return cls(name, int(version) if version else None)
-        raise ValueError(f'Could not deduce tag from file {filename}')
+        # A fresh `Tag` is built from the cached parse result, since callers
+        # are free to mutate the returned instance.
+        name, version = _parse_filename(filename)
+        return cls(name, version)
 
     @classmethod
     def get_version_from_filename(cls, filename: str) -> Optional[int]:
@@ -47,6 +68,27 @@ class Tag:
         basename, ext = os.path.splitext(filename)
         return f"{basename}-{str(self).replace(':', '-')}{ext}"
 
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Tag) \
+               and (self.name, self.version) == (other.name, other.version)
+
+    def __hash__(self) -> int:
+        # Hash the attribute tuple directly; going through `str(self)` would
+        # allocate a formatted string on every dict/set operation.
+        return hash((self.name, self.version))
+
+    def __lt__(self, other) -> bool:
+        if not isinstance(other, Tag):
+            return NotImplemented
+        # A single C-level tuple compare; an untagged version sorts before
+        # any numbered one.
+        return (self.name, self.version or 0) < (other.name, other.version or 0)
+
+    def __gt__(self, other) -> bool:
+        if not isinstance(other, Tag):
+            return NotImplemented
+        return (self.name, self.version or 0) > (other.name, other.version or 0)
+
     def __str__(self):
         if self.version:
             return f'{self.name}:{self.version}'
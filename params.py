@@ -33,7 +33,7 @@ PARAMS = {
 }
 
 
-""" 
+"""
 New datasets can be added to 'all'.
 For the input of an experiment the 'current_set_up' list can be updated.
 """
@@ -45,50 +45,57 @@ DATA = {
         # specified `fraction_test`, or specify a tuple of 2 datasets, in which
         # case the pairs from the first dataset are used for calibration and
         # the pairs from the second dataset are used for testing.
+        #
+        # We apply lazy loading to the datasets, like we do for the scorer
+        # models: each `datasets` entry is a zero-argument callable, so only
+        # the datasets of the selected setups are ever instantiated (and their
+        # resource folders scanned). Consumers call
+        # `DATA['all'][key]['datasets']()` to get the real dataset(s).
         'test': {
-            'datasets': TestDataset(),
+            'datasets': TestDataset,
             'fraction_test': .5,
         },
         'enfsi': {
-            'datasets': EnfsiDataset(years=[2011, 2012, 2013, 2017]),
+            'datasets': lambda: EnfsiDataset(years=[2011, 2012, 2013, 2017]),
             'fraction_test': .2,
         },
         'enfsi2011': {
-            'datasets': EnfsiDataset(years=[2011]),
+            'datasets': lambda: EnfsiDataset(years=[2011]),
             'fraction_test': .2,
         },
         'enfsi2012': {
-            'datasets': EnfsiDataset(years=[2012]),
+            'datasets': lambda: EnfsiDataset(years=[2012]),
             'fraction_test': .2,
         },
         'enfsi2013': {
-            'datasets': EnfsiDataset(years=[2013]),
+            'datasets': lambda: EnfsiDataset(years=[2013]),
             'fraction_test': .2,
         },
         'enfsi2017': {
-            'datasets': EnfsiDataset(years=[2017]),
+            'datasets': lambda: EnfsiDataset(years=[2017]),
             'fraction_test': .2,
         },
         'lfw': {
-            'datasets': LfwDataset(),
+            'datasets': LfwDataset,
             'fraction_test': .9,
         },
         'SC': {
-            'datasets': SCDataset(image_types=['frontal',
-                                               'rotated',
-                                               'surveillance']),
+            'datasets': lambda: SCDataset(image_types=['frontal',
+                                                       'rotated',
+                                                       'surveillance']),
             'fraction_test': .9,
         },
         'lfw_sanity_check': {
-            'datasets': (LfwDevDataset(True), LfwDevDataset(False)),
+            'datasets': lambda: (LfwDevDataset(True), LfwDevDataset(False)),
             'fraction_test': None  # Can be omitted if `datasets` is a tuple.
         },
         'lfw_enfsi': {
-            'datasets': (LfwDevDataset(True), EnfsiDataset(years=[2011, 2012, 2013, 2017])),
+            'datasets': lambda: (LfwDevDataset(True),
+                                 EnfsiDataset(years=[2011, 2012, 2013, 2017])),
             'fraction_test': None  # Can be omitted if `datasets` is a tuple.
         },
         'forenface': {
-            'datasets': ForenFaceDataset(),
+            'datasets': ForenFaceDataset,
             'fraction_test': .5,
         }
     }
@@ -130,12 +137,14 @@ For the input of an experiment the 'current_set_up' list can be updated.
 CALIBRATORS = {
     'current_set_up': ['logit'],
     'all': {
-        'logit': LogitCalibrator(),
-        'logit_normalized': NormalizedCalibrator(LogitCalibrator()),
-        'KDE': KDECalibrator(),
-        'elub_KDE': ELUBbounder(KDECalibrator()),
-        'dummy': DummyCalibrator(),
-        'fraction': FractionCalibrator(),
-        'isotonic': IsotonicCalibrator(add_one=True)
+        # Lazily instantiated, like the datasets above: each entry is a
+        # zero-argument callable and only the selected calibrators are built.
+        'logit': LogitCalibrator,
+        'logit_normalized': lambda: NormalizedCalibrator(LogitCalibrator()),
+        'KDE': KDECalibrator,
+        'elub_KDE': lambda: ELUBbounder(KDECalibrator()),
+        'dummy': DummyCalibrator,
+        'fraction': FractionCalibrator,
+        'isotonic': lambda: IsotonicCalibrator(add_one=True)
     }
 }
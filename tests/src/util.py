@@ -1,9 +1,11 @@
 import os
 import shutil
+from functools import lru_cache
 from os.path import dirname, abspath, isabs, join
 from typing import Generator
 
 
+@lru_cache(maxsize=None)
 def get_project_path(relative_path: str) -> str:
     """
     Takes a path relative to the root directory of the project (the directory
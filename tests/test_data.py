@@ -1,4 +1,3 @@
-import os
 from functools import wraps
 from typing import List
 
@@ -18,7 +17,7 @@ from lr_face.data import (FaceImage,
                           to_array,
                           split_by_identity)
 from tests.conftest import skip_on_github
-from tests.src.util import get_project_path, scratch_dir
+from tests.src.util import get_project_path
 
 
 def dataset_testable(func):
@@ -36,70 +35,71 @@ def augmenter(image: np.ndarray) -> np.ndarray:
     """
     Dummy augmenter that makes each image completely black
     """
-    return np.zeros(image.shape)
+    # Zero the buffer in place rather than allocating a second array per
+    # image; augmenters always receive a private (freshly generated or
+    # copied) buffer, so in-place writes are safe. This also preserves the
+    # input dtype.
+    image[...] = 0
+    return image
 
 
-@pytest.fixture
+# The identities used by the dummy fixtures below, materialized once at
+# module level instead of being rebuilt inside every fixture invocation.
+_DUMMY_IDS = (1, 1, 1, 2, 2, 2, 3, 3, 4, 4, 5)
+_DUMMY_IDENTITIES = tuple(f'TEST-{idx}' for idx in _DUMMY_IDS)
+
+
+@pytest.fixture(scope='session')
 def dummy_images() -> List[FaceImage]:
-    ids = [1, 1, 1, 2, 2, 2, 3, 3, 4, 4, 5]
-    return [DummyFaceImage(path='', identity=f'TEST-{idx}') for idx in ids]
+    return [DummyFaceImage(path='', identity=identity)
+            for identity in _DUMMY_IDENTITIES]
 
 
-@pytest.fixture
-def dummy_pairs() -> List[FacePair]:
-    ids = [1, 1, 1, 2, 2, 2, 3, 3, 4, 4, 5]
-    images = [DummyFaceImage(path='', identity=f'TEST-{idx}') for idx in ids]
-    return make_pairs(images)
+@pytest.fixture(scope='session')
+def dummy_pairs(dummy_images) -> List[FacePair]:
+    return make_pairs(dummy_images)
 
 
-@pytest.fixture
-def dummy_triplets() -> List[FaceTriplet]:
-    ids = [1, 1, 1, 2, 2, 2, 3, 3, 4, 4, 5]
-    images = [DummyFaceImage(path='', identity=f'TEST-{idx}') for idx in ids]
-    return make_triplets(images)
+@pytest.fixture(scope='session')
+def dummy_triplets(dummy_images) -> List[FaceTriplet]:
+    return make_triplets(dummy_images)
 
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 @dataset_testable
 def enfsi_2011():
     return EnfsiDataset(years=[2011])
 
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 @dataset_testable
 def enfsi_all():
     return EnfsiDataset(years=[2011, 2012, 2013, 2017])
 
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 @dataset_testable
 def forenface():
     return ForenFaceDataset()
 
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 @dataset_testable
 def lfw():
     return LfwDataset()
 
 
-@pytest.fixture()
-def scratch():
-    yield from scratch_dir('scratch/test_data')
-
-
 ###############
 # `FaceImage` #
 ###############
 
-def test_get_image(dummy_images, scratch):
+def test_get_image(dummy_images):
     width = 100
     height = 50
     resolution = (height, width)
     image = dummy_images[0].get_image(resolution, normalize=False)
-    image_path = os.path.join(scratch, 'tmp.jpg')
-    cv2.imwrite(image_path, image)
-    face_image = FaceImage(image_path, dummy_images[0].identity)
+    buffer = cv2.imencode('.jpg', image)[1].tobytes()
+    face_image = FaceImage.from_bytes(buffer, dummy_images[0].identity)
     reloaded_image = face_image.get_image(resolution)
     assert reloaded_image.shape == (*resolution, 3)
 
@@ -148,7 +148,7 @@ def test_enfsi_dataset_has_correct_num_images(enfsi_all):
 @skip_on_github
 def test_enfsi_dataset_has_correct_num_pairs(enfsi_all):
     assert len(enfsi_all.pairs) == 135
-    assert all([a.meta['idx'] == b.meta['idx'] for a, b in enfsi_all.pairs])
+    assert all(a.meta['idx'] == b.meta['idx'] for a, b in enfsi_all.pairs)
 
 
 ###############
@@ -164,128 +164,47 @@ def test_forenface_dataset_has_correct_num_images(forenface):
 # `make_pairs()` #
 ##################
 
-def test_make_pairs_positive_and_negative_no_n(dummy_images):
-    pairs = make_pairs(dummy_images, same=None, n=None)
-    positive_pairs = [p for p in pairs if p.same_identity]
-    negative_pairs = [p for p in pairs if not p.same_identity]
-    assert len(positive_pairs) == len(negative_pairs) == 8
-    assert positive_pairs[0].first.identity == 'TEST-1'
-    assert positive_pairs[1].first.identity == 'TEST-1'
-    assert positive_pairs[2].first.identity == 'TEST-1'
-    assert positive_pairs[3].first.identity == 'TEST-2'
-    assert positive_pairs[4].first.identity == 'TEST-2'
-    assert positive_pairs[5].first.identity == 'TEST-2'
-    assert positive_pairs[6].first.identity == 'TEST-3'
-    assert positive_pairs[7].first.identity == 'TEST-4'
-
-
-def test_make_pairs_positive_and_negative_fixed_n(dummy_images):
-    n = 8
-    pairs = make_pairs(dummy_images, same=None, n=n)
-    assert len(pairs) == n
-
-
-def test_make_pairs_positive_and_negative_fixed_n_odd(dummy_images):
-    n = 7
-    pairs = make_pairs(dummy_images, same=None, n=n)
-    assert len(pairs) == n
-
-
-def test_make_pairs_positive_and_negative_large_n(dummy_images):
-    n = 10000
-    pairs = make_pairs(dummy_images, same=None, n=n)
-    assert len(pairs) == 16
-
-
-def test_make_pairs_positive_only_no_n(dummy_images):
-    pairs = make_pairs(dummy_images, same=True, n=None)
+@pytest.mark.parametrize('same, n, expected_len, expected_positive', [
+    # With `same=None` we get all positive pairs plus as many negatives.
+    (None, None, 16, 8),
+    (None, 8, 8, None),  # A sampled subset has a random positive count.
+    (None, 7, 7, None),
+    (None, 10000, 16, 8),
+    # With `same=True` we get positive pairs only, at most all 8 of them.
+    (True, None, 8, 8),
+    (True, 8, 8, 8),
+    (True, 7, 7, 7),
+    (True, 10000, 8, 8),
+    # With `same=False` we get negative pairs only; all 94 when `n` is
+    # omitted, and exactly `n` (with duplicates) otherwise.
+    (False, None, 94, 0),
+    (False, 48, 48, 0),
+    (False, 47, 47, 0),
+    (False, 10000, 10000, 0),
+])
+def test_make_pairs_lengths(dummy_images, same, n, expected_len,
+                            expected_positive):
+    pairs = make_pairs(dummy_images, same=same, n=n)
+    assert len(pairs) == expected_len
+    if expected_positive is not None:
+        assert sum(p.same_identity for p in pairs) == expected_positive
+
+
+@pytest.mark.parametrize('same', [None, True])
+def test_make_pairs_positive_order(dummy_images, same):
+    pairs = make_pairs(dummy_images, same=same)
     positive_pairs = [p for p in pairs if p.same_identity]
-    assert len(positive_pairs) == len(pairs) == 8
-    assert positive_pairs[0].first.identity == 'TEST-1'
-    assert positive_pairs[1].first.identity == 'TEST-1'
-    assert positive_pairs[2].first.identity == 'TEST-1'
-    assert positive_pairs[3].first.identity == 'TEST-2'
-    assert positive_pairs[4].first.identity == 'TEST-2'
-    assert positive_pairs[5].first.identity == 'TEST-2'
-    assert positive_pairs[6].first.identity == 'TEST-3'
-    assert positive_pairs[7].first.identity == 'TEST-4'
-
-
-def test_make_pairs_positive_only_fixed_n(dummy_images):
-    n = 8
-    pairs = make_pairs(dummy_images, same=True, n=n)
-    positive_pairs = [p for p in pairs if p.same_identity]
-    assert len(positive_pairs) == len(pairs) == 8
-
-
-def test_make_pairs_positive_only_fixed_n_odd(dummy_images):
-    n = 7
-    pairs = make_pairs(dummy_images, same=True, n=n)
-    positive_pairs = [p for p in pairs if p.same_identity]
-    assert len(positive_pairs) == len(pairs) == 7
-
-
-def test_make_pairs_positive_only_large_n(dummy_images):
-    n = 10000
-    pairs = make_pairs(dummy_images, same=True, n=n)
-    positive_pairs = [p for p in pairs if p.same_identity]
-    assert len(positive_pairs) == len(pairs) == 8
-
-
-def test_make_pairs_negative_only_no_n(dummy_images):
-    pairs = make_pairs(dummy_images, same=False, n=None)
-    negative_pairs = [p for p in pairs if not p.same_identity]
-    assert len(negative_pairs) == len(pairs) == 94
-    assert negative_pairs[0].first.identity == 'TEST-1'
-    assert negative_pairs[24].first.identity == 'TEST-2'
-    assert negative_pairs[48].first.identity == 'TEST-3'
-    assert negative_pairs[66].first.identity == 'TEST-4'
-    assert negative_pairs[84].first.identity == 'TEST-5'
-
-
-def test_make_pairs_negative_only_fixed_n(dummy_images):
-    n = 48
-    pairs = make_pairs(dummy_images, same=False, n=n)
-    negative_pairs = [p for p in pairs if not p.same_identity]
-    assert len(negative_pairs) == len(pairs) == n
-
+    expected = ['TEST-1'] * 3 + ['TEST-2'] * 3 + ['TEST-3', 'TEST-4']
+    assert [p.first.identity for p in positive_pairs] == expected
 
-def test_make_pairs_negative_only_fixed_n_odd(dummy_images):
-    n = 47
-    pairs = make_pairs(dummy_images, same=False, n=n)
-    negative_pairs = [p for p in pairs if not p.same_identity]
-    assert len(negative_pairs) == len(pairs) == n
 
-
-def test_make_pairs_negative_only_large_n(dummy_images):
-    n = 10000
-    pairs = make_pairs(dummy_images, same=False, n=n)
-    negative_pairs = [p for p in pairs if not p.same_identity]
-    assert len(negative_pairs) == len(pairs) == n
-
-
-##################
-# `EnfsiDataset` #
-##################
-
-@skip_on_github
-def test_enfsi_dataset_has_correct_num_images(enfsi_all):
-    assert len(enfsi_all.images) == 270
-
-
-@skip_on_github
-def test_enfsi_dataset_has_correct_num_pairs(enfsi_all):
-    assert len(enfsi_all.pairs) == 135
-    assert all([a.meta['idx'] == b.meta['idx'] for a, b in enfsi_all.pairs])
-
-
-###############
-# `ForenFace` #
-###############
-
-@skip_on_github
-def test_forenface_dataset_has_correct_num_images(forenface):
-    assert len(forenface.images) == 2476
+def test_make_pairs_negative_order(dummy_images):
+    pairs = make_pairs(dummy_images, same=False)
+    assert pairs[0].first.identity == 'TEST-1'
+    assert pairs[24].first.identity == 'TEST-2'
+    assert pairs[48].first.identity == 'TEST-3'
+    assert pairs[66].first.identity == 'TEST-4'
+    assert pairs[84].first.identity == 'TEST-5'
 
 
 #####################
@@ -319,15 +238,15 @@ def test_face_images_to_array(dummy_images):
     assert array.shape == (len(dummy_images), *resolution, 3)
 
 
-def test_face_images_to_array_with_various_resolutions(dummy_images, scratch):
+def test_face_images_to_array_with_various_resolutions(dummy_images):
     face_images = []
     for i, dummy_image in enumerate(dummy_images):
         image = dummy_image.get_image(normalize=False)
         dimensions = (50 + i, 100)
         image = cv2.resize(image, dimensions)
-        image_path = os.path.join(scratch, f'tmp_{i}.jpg')
-        cv2.imwrite(image_path, image)
-        face_images.append(FaceImage(image_path, dummy_images[0].identity))
+        buffer = cv2.imencode('.jpg', image)[1].tobytes()
+        face_images.append(
+            FaceImage.from_bytes(buffer, dummy_images[0].identity))
 
     # Should raise an exception, because we do not allow `to_array` to accept
     # images of various shapes.